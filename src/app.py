@@ -2,17 +2,17 @@
 
 
 import random
-import sys
+import sqlite3
+import time
 import tkinter as tk
+from collections import deque
 from tkinter import ttk
 from tkinter import messagebox
-from typing import Tuple, cast, Any
+from typing import Tuple, cast, Any, Callable, Deque, Dict, Iterable, Optional
 
+from .history import History
 from .misc import GridCoordinates, HandmadeTextures, adjoining_coordinates
-
-
-# increase recursion limit
-sys.setrecursionlimit(2500)
+from .stats import GameRecord, StatsStore
 
 
 class MineSweeperApplication(tk.Tk):
@@ -59,6 +59,7 @@ class MineSweeperApplication(tk.Tk):
         self.difficulty_list = ["Beginner", "Intermediate", "Expert", "Master", "Custom"]
         self.difficulty = tk.StringVar(value="Beginner")
         self.difficulty.trace_add("write", self.difficulty_change)
+        self.ripple_var = tk.BooleanVar(value=False)
 
         # add entry for width
         self.width_label = tk.Label(self.top_panel, text="Width: ")
@@ -86,6 +87,10 @@ class MineSweeperApplication(tk.Tk):
         self.difficulty_combobox.grid(column=2, row=0)
         self.difficulty.set(value="Beginner")
 
+        # add checkbox to reveal squares with ripple animation
+        self.ripple_checkbutton = tk.Checkbutton(self.top_panel, text="Ripple", variable=self.ripple_var)
+        self.ripple_checkbutton.grid(column=2, row=2)
+
         # add button to change flag and click mode
         self.mode_label = tk.Label(self.top_panel, text="Cursor: ")
         self.mode_label.grid(column=3, row=1)
@@ -93,6 +98,20 @@ class MineSweeperApplication(tk.Tk):
                                      command=self.change_mode, width=3)
         self.flag_button.grid(column=4, row=1)
 
+        # add statistics button
+        self.stats_button = tk.Button(self.top_panel, text="Stats", command=self.show_stats, width=6)
+        self.stats_button.grid(column=5, row=0)
+
+        # add undo and redo buttons
+        self.undo_button = tk.Button(self.top_panel, text="Undo", command=self.undo, width=6)
+        self.undo_button.grid(column=5, row=1)
+        self.redo_button = tk.Button(self.top_panel, text="Redo", command=self.redo, width=6)
+        self.redo_button.grid(column=5, row=2)
+        for sequence in ("<Control-z>", "<Control-Z>"):
+            self.bind(sequence, self.on_undo_shortcut)
+        for sequence in ("<Control-y>", "<Control-Y>"):
+            self.bind(sequence, self.on_redo_shortcut)
+
         # add flags counter
         self.flags_counter_label = tk.Label(self.top_panel, text="Flags count: ")
         self.flags_counter_label.grid(column=3, row=2)
@@ -108,10 +127,19 @@ class MineSweeperApplication(tk.Tk):
         # start timer
         self.update_time()
 
+        # open store of finished games statistics, game works without it if store can't be opened
+        self.stats: Optional[StatsStore] = None
+        try:
+            self.stats = StatsStore("./stats.sqlite3")
+        except sqlite3.Error as error:
+            self.stats_button.configure(state="disabled")
+            messagebox.showerror("Statistics error", f"Statistics are not available: {error}")
+
         # create game minefield
         self.minefield = MineField(self.container, self, n_columns=self.width_var.get(),
                                    n_rows=self.height_var.get(), n_bombs=self.bombs_var.get())
         self.minefield.pack(side="top", fill="none", expand=True)
+        self.update_history_buttons()
 
     @property
     def number_of_flags(self) -> int:
@@ -164,6 +192,7 @@ class MineSweeperApplication(tk.Tk):
             self.minefield = MineField(self.container, self, n_columns=self.width_var.get(),
                                        n_rows=self.height_var.get(), n_bombs=self.bombs_var.get())
             self.minefield.pack(side="top", fill="none", expand=True)
+            self.update_history_buttons()
 
     def change_mode(self) -> None:
         """ Switch is_flag to opposite. """
@@ -208,6 +237,51 @@ class MineSweeperApplication(tk.Tk):
             self.time_var.set(value=int(self.time_var.get() + 1))
         self.after(1000, self.update_time)
 
+    def undo(self) -> None:
+        """ Undo last action on minefield. """
+        self.minefield.undo()
+
+    def redo(self) -> None:
+        """ Redo last undone action on minefield. """
+        self.minefield.redo()
+
+    def on_undo_shortcut(self, event: tk.Event) -> None:
+        """ Undo last action on minefield, unless shortcut is pressed inside entry. """
+        if not isinstance(event.widget, (tk.Entry, ttk.Entry)):
+            self.undo()
+
+    def on_redo_shortcut(self, event: tk.Event) -> None:
+        """ Redo last undone action on minefield, unless shortcut is pressed inside entry. """
+        if not isinstance(event.widget, (tk.Entry, ttk.Entry)):
+            self.redo()
+
+    def update_history_buttons(self) -> None:
+        """ Enable undo and redo buttons only if minefield has action to undo or redo. """
+        self.undo_button.configure(state="normal" if self.minefield.history.can_undo else "disabled")
+        self.redo_button.configure(state="normal" if self.minefield.history.can_redo else "disabled")
+
+    def show_stats(self) -> None:
+        """ Show best times and win rate for size and bombs number of current minefield. """
+        if self.stats is None:
+            return
+        width, height, bombs = self.minefield.n_columns, self.minefield.n_rows, self.minefield.n_bombs
+        lines = [f"Minefield {width}x{height} with {bombs} bombs.", "", "Best times:"]
+        best_times = self.stats.best_times(width, height, bombs, limit=5)
+        for place, (game_time, three_bv, _) in enumerate(best_times, start=1):
+            lines.append(f"{place}. {game_time} s (3BV {three_bv})")
+        if not best_times:
+            lines.append("no wins yet")
+        win_rate = self.stats.win_rate(width, height, bombs, last=100)
+        if win_rate is not None:
+            lines += ["", f"Win rate of last 100 games: {win_rate:.0%}"]
+        messagebox.showinfo("Statistics", "\n".join(lines))
+
+    def destroy(self) -> None:
+        """ Destroy window and close statistics store. """
+        super().destroy()
+        if self.stats is not None:
+            self.stats.close()
+
 
 class MineField(tk.Frame):
     """
@@ -215,7 +289,7 @@ class MineField(tk.Frame):
     """
 
     def __init__(self, master: tk.Widget, window: MineSweeperApplication,
-                 n_columns: int = 9, n_rows: int = 9, n_bombs: int = 10) -> None:
+                 n_columns: int = 9, n_rows: int = 9, n_bombs: int = 10, seed: Optional[int] = None) -> None:
         """
         Game minefield.
         Creates minefield with Square class objects inside based on given arguments.
@@ -225,22 +299,45 @@ class MineField(tk.Frame):
         :param n_columns: Number of columns in grid with Square objects.
         :param n_rows: Number of rows in grid with Square objects.
         :param n_bombs: Number of bombs among Square objects.
+        :param seed: Seed for random placing of bombs. random seed will be used if None.
         """
         super().__init__(master=master)
         self.window = window
+        self.n_columns, self.n_rows, self.n_bombs = n_columns, n_rows, n_bombs
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.random = random.Random(self.seed)
 
         # is in mode of flag set or in mode of mouse click
         self._is_flag = False
         # count of flags
         self._number_of_flags = self.window.number_of_flags
+        # is game already ended by win or lose
+        self.is_game_over = False
+        # square with the bomb which ended the game
+        self._lose_point: Optional[Square] = None
+        # was any action undone, results of such games are not recorded
+        self.is_practice = False
+        # undo and redo history of actions
+        self.history = History()
+
+        # squares which are unhidden in game state, but not yet on screen, with their distance from reveal start
+        self.reveal_queue: Deque[Tuple[int, "Square"]] = deque()
+        # id of scheduled reveal batch
+        self.reveal_job: Optional[str] = None
+        # function to call when reveal queue become empty
+        self._on_reveal_end: Optional[Callable[[], None]] = None
+        # seconds which one batch of reveal can take before giving control back to event loop
+        self.reveal_time_budget = 0.008
+        # milliseconds between waves of ripple animation
+        self.ripple_delay = 15
 
         # create list with all Square objects coordinates
         self.coordinates = [GridCoordinates(x, y) for x in range(n_columns) for y in range(n_rows)]
 
         # create set with Square objects coordinates which should contain the bomb
         self.bombs_coordinates = set()
-        self.create_random_coordinates = lambda: GridCoordinates(random.randint(0, n_columns - 1),
-                                                                 random.randint(0, n_rows - 1))
+        self.create_random_coordinates = lambda: GridCoordinates(self.random.randint(0, n_columns - 1),
+                                                                 self.random.randint(0, n_rows - 1))
         random_coordinates = self.create_random_coordinates()
         for x in range(n_bombs):
             # make sure that's every coordinate for bomb is unique
@@ -249,9 +346,11 @@ class MineField(tk.Frame):
             self.bombs_coordinates.add(random_coordinates)
 
         # create Square objects on every coordinate in set and put in to MineField grid
+        self.squares: Dict[GridCoordinates, Square] = {}
         for coordinate in self.coordinates:
             square = Square(self, coordinate)
             square.grid(column=coordinate[0], row=coordinate[1], rowspan=1, columnspan=1)
+            self.squares[coordinate] = square
 
         # add bombs to squares and add number to bomb counter inside other squares near to bombs
         for _square in self.children.items():
@@ -294,21 +393,85 @@ class MineField(tk.Frame):
         else:
             raise ValueError("MineField property 'number_of_flags' accepts only a value with the type 'int'.")
 
+    @property
+    def lose_point(self) -> Optional["Square"]:
+        """ Get square with the bomb which ended the game. """
+        return self._lose_point
+
+    @lose_point.setter
+    def lose_point(self, square: Optional["Square"]) -> None:
+        """ Set square with the bomb which ended the game and mark it with fail texture. """
+        self.history.record(self, "lose_point", self._lose_point, square)
+        if self._lose_point is not None:
+            self._lose_point.label.configure(image=self.window.textures.bomb_unhidden)
+        self._lose_point = square
+        if square is not None:
+            square.label.configure(image=self.window.textures.fail_bomb_unhidden)
+
     def make_all_adjoining_blank_squares_unhidden(self, target_square: "Square") -> None:
         """
         Method for making all adjoining squares without bombs unhidden.
+        Squares become unhidden in game state right away and drawn later by reveal queue.
 
         :param target_square: Object of target square.
         :return: None.
         """
-        adjoining_set = adjoining_coordinates(target_square.grid_coordinates)
-        for _square in self.children.items():
-            square = cast(Square, _square[1])
-            if square.is_hidden and square.grid_coordinates in adjoining_set \
-                    and not square.is_bomb and not square.is_flagged:
-                square.is_hidden = False
-                if square.bomb_count == 0:
-                    self.make_all_adjoining_blank_squares_unhidden(square)
+        to_check = deque([(0, target_square)])
+        while to_check:
+            depth, square = to_check.popleft()
+            for coordinates in adjoining_coordinates(square.grid_coordinates):
+                s = self.squares.get(coordinates)
+                if s is not None and s.is_hidden and not s.is_bomb and not s.is_flagged:
+                    s.mark_hidden(False)
+                    self.reveal_queue.append((depth + 1, s))
+                    if s.bomb_count == 0:
+                        to_check.append((depth + 1, s))
+        self.schedule_reveal()
+
+    def schedule_reveal(self) -> None:
+        """
+        Method for scheduling next batch of reveal if there are squares to draw.
+
+        :return: None.
+        """
+        if self.reveal_job is None and self.reveal_queue:
+            self.reveal_job = self.after(1, self.process_reveal_queue)
+
+    def process_reveal_queue(self) -> None:
+        """
+        Method for drawing next batch of squares from reveal queue and scheduling the next batch.
+        Batch is limited by time budget, and also by one wave of squares if ripple animation is on.
+
+        :return: None.
+        """
+        self.reveal_job = None
+        delay = 1
+        ripple = self.window.ripple_var.get()
+        depth = self.reveal_queue[0][0] if self.reveal_queue else 0
+        deadline = time.perf_counter() + self.reveal_time_budget
+        while self.reveal_queue and time.perf_counter() < deadline \
+                and (not ripple or self.reveal_queue[0][0] == depth):
+            self.reveal_queue.popleft()[1].redraw()
+        # wait before the next wave only if this one is fully drawn
+        if ripple and self.reveal_queue and self.reveal_queue[0][0] != depth:
+            delay = self.ripple_delay
+        if self.reveal_queue:
+            self.reveal_job = self.after(delay, self.process_reveal_queue)
+        elif self._on_reveal_end is not None:
+            callback, self._on_reveal_end = self._on_reveal_end, None
+            callback()
+
+    def when_revealed(self, callback: Callable[[], None]) -> None:
+        """
+        Method for calling function after all squares in reveal queue are drawn.
+
+        :param callback: Function to call.
+        :return: None.
+        """
+        if self.reveal_job is None and not self.reveal_queue:
+            callback()
+        else:
+            self._on_reveal_end = callback
 
     def show_all_mines(self) -> None:
         """
@@ -340,33 +503,144 @@ class MineField(tk.Frame):
         :return: None.
         """
         # make all adjoining blank squares unhidden
-        for square in self.children.items():
-            s = cast(Square, square[1])
+        for s in self.squares.values():
             if not s.is_bomb and s.bomb_count == 0 and not s.is_hidden:
                 self.make_all_adjoining_blank_squares_unhidden(s)
         # check if the game state is win, lose, or nothing.
         self.window.time_count = True
         win, lose, lose_point = True, False, None
-        for square in self.children.items():
-            s = cast(Square, square[1])
+        for s in self.squares.values():
             if s.is_bomb and not s.is_hidden:
                 lose = True
                 lose_point = s
             elif not s.is_bomb and s.is_hidden:
                 win = False
-        if lose:
+        if lose or win:
             self.window.time_count = False
+            self.history.record(self, "is_game_over", self.is_game_over, True)
+            self.is_game_over = True
+            self.record_result(not lose)
+        if lose:
             self.show_all_mines()
-            lose_point.label.configure(image=self.window.textures.fail_bomb_unhidden)
-            messagebox.showwarning("MineSweeper", "you lose")
+            self.lose_point = lose_point
+            self.when_revealed(lambda: self.show_result(False))
         elif win:
-            self.window.time_count = False
             self.flag_all_mines()
+            self.when_revealed(lambda: self.show_result(True))
+
+    def three_bv(self) -> int:
+        """
+        Method for counting 3BV of minefield, minimal number of clicks needed to unhide all squares without bombs.
+
+        :return: 3BV of minefield.
+        """
+        result = 0
+        opened = set()
+        # every opening of blank squares takes one click
+        for coordinates, square in self.squares.items():
+            if not square.is_bomb and square.bomb_count == 0 and coordinates not in opened:
+                result += 1
+                opened.add(coordinates)
+                to_check = [coordinates]
+                while to_check:
+                    for c in adjoining_coordinates(to_check.pop()):
+                        s = self.squares.get(c)
+                        if s is not None and c not in opened:
+                            opened.add(c)
+                            if s.bomb_count == 0:
+                                to_check.append(c)
+        # every square outside of openings takes one click
+        for coordinates, square in self.squares.items():
+            if not square.is_bomb and coordinates not in opened:
+                result += 1
+        return result
+
+    def record_result(self, win: bool) -> None:
+        """
+        Method for adding finished game to the statistics store.
+
+        :param win: Is game won or lost.
+        :return: None.
+        """
+        if self.is_practice or self.window.stats is None:
+            return
+        self.window.stats.add(GameRecord(width=self.n_columns, height=self.n_rows, bombs=self.n_bombs,
+                                         time=self.window.time_var.get(), three_bv=self.three_bv(),
+                                         seed=self.seed, is_win=win))
+
+    def show_result(self, win: bool) -> None:
+        """
+        Method for disabling all squares and showing the game result.
+
+        :param win: Is game won or lost.
+        :return: None.
+        """
+        for s in self.squares.values():
+            s.is_active = False
+        if win:
             messagebox.showinfo("MineSweeper", "you win")
-        if lose or win:
-            for square in self.children.items():
-                s = cast(Square, square[1])
-                s.is_active = False
+        else:
+            messagebox.showwarning("MineSweeper", "you lose")
+
+    def undo(self) -> bool:
+        """
+        Method for undoing last action on minefield.
+
+        :return: True if action was undone, False if there is nothing to undo.
+        """
+        changes = self.history.undo()
+        if changes is None:
+            return False
+        self.is_practice = True
+        self.apply_changes((c.target, c.attribute, c.old) for c in reversed(changes))
+        self.window.update_history_buttons()
+        return True
+
+    def redo(self) -> bool:
+        """
+        Method for redoing last undone action on minefield.
+
+        :return: True if action was redone, False if there is nothing to redo.
+        """
+        changes = self.history.redo()
+        if changes is None:
+            return False
+        self.apply_changes((c.target, c.attribute, c.new) for c in changes)
+        self.window.update_history_buttons()
+        return True
+
+    def apply_changes(self, changes: Iterable[Tuple[Any, str, Any]]) -> None:
+        """
+        Method for setting attributes from history. squares are drawn by reveal queue.
+
+        :param changes: Tuples of (target, attribute, value) to set.
+        :return: None.
+        """
+        is_game_over_changed = False
+        for target, attribute, value in changes:
+            if target is self:
+                is_game_over_changed = True
+            if attribute == "is_hidden":
+                target.mark_hidden(value)
+                self.reveal_queue.append((0, target))
+            else:
+                setattr(target, attribute, value)
+        self.schedule_reveal()
+        # timer runs only while game is started and not ended
+        self.window.time_count = self.history.can_undo and not self.is_game_over
+        if is_game_over_changed:
+            # result of the game is already known, update squares right away without dialog
+            self._on_reveal_end = None
+            for s in self.squares.values():
+                if s.is_active == self.is_game_over:
+                    s.is_active = not self.is_game_over
+
+    def destroy(self) -> None:
+        """ Cancel scheduled reveal batch and destroy minefield. """
+        if self.reveal_job is not None:
+            self.after_cancel(self.reveal_job)
+            self.reveal_job = None
+        super().destroy()
 
 
 class Square(tk.Frame):
@@ -430,7 +704,7 @@ class Square(tk.Frame):
             if state:
                 for child in self.winfo_children():
                     child = cast(tk.Label, child)
-                    child.configure(state="active")
+                    child.configure(state="normal")
             else:
                 for child in self.winfo_children():
                     child = cast(tk.Label, child)
@@ -464,14 +738,24 @@ class Square(tk.Frame):
     def is_hidden(self, state: bool) -> None:
         """ Set this square to hidden or unhidden state. """
         if isinstance(state, bool):
+            self._master.history.record(self, "is_hidden", self._is_hidden, state)
             self._is_hidden = state
-            if state:
-                self._button.grid(column=0, row=0)
-            else:
-                self._button.grid_forget()
+            self.redraw()
         else:
             raise ValueError("Square property 'is_hidden' accepts only a value with the type 'bool'.")
 
+    def mark_hidden(self, state: bool) -> None:
+        """ Set this square to hidden or unhidden in game state only. widgets will be updated by redraw. """
+        self._master.history.record(self, "is_hidden", self._is_hidden, state)
+        self._is_hidden = state
+
+    def redraw(self) -> None:
+        """ Update square widgets to match its hidden state. """
+        if self._is_hidden:
+            self._button.grid(column=0, row=0)
+        else:
+            self._button.grid_forget()
+
     @property
     def is_flagged(self) -> bool:
         """ Get is this square flagged. """
@@ -481,6 +765,7 @@ class Square(tk.Frame):
     def is_flagged(self, state: bool) -> None:
         """ Set or get rid of the flag on this square. also, updates minefield number of flags."""
         if isinstance(state, bool):
+            self._master.history.record(self, "is_flagged", self._is_flagged, state)
             self._is_flagged = state
             if state:
                 self._button.configure(image=self._master.window.textures.flag_hidden)
@@ -539,14 +824,19 @@ class Square(tk.Frame):
 
     def _on_button_press(self) -> None:
         """ Method for square button press. make square unhidden if not flag and run field scan. """
-        if self._master.is_flag:
-            if self.is_flagged:
-                self.is_flagged = False
-            elif not self._master.number_of_flags <= 0:
-                self.is_flagged = True
-        elif not self.is_flagged:
-            self.is_hidden = False
-            self._master.field_scan()
+        # square may be already unhidden or game ended while reveal is still drawn
+        if self._master.is_game_over or not self.is_hidden:
+            return
+        with self._master.history.action():
+            if self._master.is_flag:
+                if self.is_flagged:
+                    self.is_flagged = False
+                elif not self._master.number_of_flags <= 0:
+                    self.is_flagged = True
+            elif not self.is_flagged:
+                self.is_hidden = False
+                self._master.field_scan()
+        self._master.window.update_history_buttons()
 
     @property
     def label(self) -> tk.Label:
@@ -0,0 +1,93 @@
+""" Module with undo and redo history of minefield actions. """
+
+
+from contextlib import contextmanager
+from typing import Any, Iterator, List, NamedTuple, Optional
+
+
+class Change(NamedTuple):
+    """
+    Named tuple for one change of object attribute.
+
+    Change(target: Any, attribute: str, old: Any, new: Any)
+    """
+    target: Any
+    attribute: str
+    old: Any
+    new: Any
+
+
+class History:
+    """
+    Unlimited undo and redo history.
+    Every action stores only changes it made, so undo and redo take time proportional to the action size.
+    """
+
+    def __init__(self) -> None:
+        """ Unlimited undo and redo history. """
+        self._undo_actions: List[List[Change]] = []
+        self._redo_actions: List[List[Change]] = []
+        # changes of action which is recorded right now
+        self._current: Optional[List[Change]] = None
+
+    @property
+    def can_undo(self) -> bool:
+        """ Get is there action to undo. """
+        return bool(self._undo_actions)
+
+    @property
+    def can_redo(self) -> bool:
+        """ Get is there action to redo. """
+        return bool(self._redo_actions)
+
+    @contextmanager
+    def action(self) -> Iterator[None]:
+        """ Group all changes recorded inside 'with' block into one action. nested blocks join outer action. """
+        if self._current is not None:
+            yield
+            return
+        self._current = []
+        try:
+            yield
+        finally:
+            if self._current:
+                self._undo_actions.append(self._current)
+                self._redo_actions.clear()
+            self._current = None
+
+    def record(self, target: Any, attribute: str, old: Any, new: Any) -> None:
+        """
+        Method for adding change to current action. does nothing outside of action.
+
+        :param target: Changed object.
+        :param attribute: Name of changed attribute.
+        :param old: Value before change.
+        :param new: Value after change.
+        :return: None.
+        """
+        if self._current is not None and old != new:
+            self._current.append(Change(target, attribute, old, new))
+
+    def undo(self) -> Optional[List[Change]]:
+        """
+        Method for moving last action to redo history.
+
+        :return: Changes of the action in order they were made, or None if there is nothing to undo.
+        """
+        if not self._undo_actions:
+            return None
+        changes = self._undo_actions.pop()
+        self._redo_actions.append(changes)
+        return changes
+
+    def redo(self) -> Optional[List[Change]]:
+        """
+        Method for moving last undone action back to undo history.
+
+        :return: Changes of the action in order they were made, or None if there is nothing to redo.
+        """
+        if not self._redo_actions:
+            return None
+        changes = self._redo_actions.pop()
+        self._undo_actions.append(changes)
+        return changes
@@ -0,0 +1,209 @@
+""" Module with persistent storage of finished games statistics. """
+
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class GameRecord(NamedTuple):
+    """
+    Named tuple for one finished game.
+
+    GameRecord(width: int, height: int, bombs: int, time: int, three_bv: int, seed: int, is_win: bool)
+    """
+    width: int
+    height: int
+    bombs: int
+    time: int
+    three_bv: int
+    seed: int
+    is_win: bool
+
+
+class StatsStore:
+    """
+    SQLite storage of finished games.
+    Records are written in batches by background thread, so adding them never waits for disk.
+    """
+
+    def __init__(self, path: str, batch_size: int = 10000, retries: int = 5, retry_delay: float = 0.5) -> None:
+        """
+        SQLite storage of finished games.
+
+        :param path: Path to database file.
+        :param batch_size: Max number of records written in one transaction.
+        :param retries: Number of retries of failed batch write before the batch is dropped.
+        :param retry_delay: Seconds to wait before first retry, doubled on every next retry.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+        # queue of record lists waiting to be written, None stops the writer
+        self._queue: "queue.Queue[Optional[List[GameRecord]]]" = queue.Queue()
+
+        # create tables and indexes, connection for queries is used only from thread which created the store
+        self._connection = self._connect()
+        try:
+            self._create_schema()
+            # open connection for background writer here, so errors of opening database reach the caller
+            self._writer_connection = self._connect(check_same_thread=False)
+        except sqlite3.Error:
+            self._connection.close()
+            raise
+
+        # start background writer
+        self._writer = threading.Thread(target=self._write_loop, name="StatsStoreWriter", daemon=True)
+        self._writer.start()
+
+    def _create_schema(self) -> None:
+        """ Create table and indexes if they don't exist. """
+        with self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS games (
+                    id INTEGER PRIMARY KEY,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    bombs INTEGER NOT NULL,
+                    time INTEGER NOT NULL,
+                    three_bv INTEGER NOT NULL,
+                    seed INTEGER NOT NULL,
+                    is_win INTEGER NOT NULL,
+                    finished_at REAL NOT NULL DEFAULT (julianday('now'))
+                )
+            """)
+            # best times of preset are read straight from this index in time order
+            self._connection.execute("CREATE INDEX IF NOT EXISTS games_best_times "
+                                     "ON games (width, height, bombs, is_win, time)")
+            # last games of preset are read from this index in reverse id order
+            self._connection.execute("CREATE INDEX IF NOT EXISTS games_by_preset "
+                                     "ON games (width, height, bombs)")
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        """ Open new connection to database. """
+        connection = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def _write_loop(self) -> None:
+        """ Write queued records in batches until stopped. """
+        try:
+            running = True
+            while running:
+                # wait for the first records, then take everything already queued up to batch size
+                batch: List[GameRecord] = []
+                records = self._queue.get()
+                taken = 1
+                try:
+                    while records is not None:
+                        batch.extend(records)
+                        if len(batch) >= self.batch_size:
+                            break
+                        try:
+                            records = self._queue.get_nowait()
+                            taken += 1
+                        except queue.Empty:
+                            break
+                    running = records is not None
+                    if batch:
+                        self._write_batch(batch)
+                except Exception:
+                    logger.exception("Failed to write %d game records to '%s'.", len(batch), self.path)
+                finally:
+                    for _ in range(taken):
+                        self._queue.task_done()
+        finally:
+            self._writer_connection.close()
+
+    def _write_batch(self, batch: List[GameRecord]) -> None:
+        """ Write batch of records in one transaction, retry with growing delay if database is busy. """
+        for attempt in range(self.retries + 1):
+            try:
+                with self._writer_connection:
+                    self._writer_connection.executemany(
+                        "INSERT INTO games (width, height, bombs, time, three_bv, seed, is_win) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                return
+            except sqlite3.Error as error:
+                if attempt == self.retries:
+                    logger.error("Dropped %d game records, failed to write them to '%s': %s",
+                                 len(batch), self.path, error)
+                    return
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def add(self, record: GameRecord) -> None:
+        """
+        Method for adding finished game to the store. returns without waiting for write.
+
+        :param record: Record of finished game.
+        :return: None.
+        """
+        self._queue.put([record])
+
+    def add_many(self, records: Iterable[GameRecord]) -> None:
+        """
+        Method for adding many finished games to the store. returns without waiting for write.
+
+        :param records: Records of finished games.
+        :return: None.
+        """
+        records = iter(records)
+        batch = list(islice(records, self.batch_size))
+        while batch:
+            self._queue.put(batch)
+            batch = list(islice(records, self.batch_size))
+
+    def flush(self) -> None:
+        """ Wait until all added records are written. """
+        self._queue.join()
+
+    def close(self) -> None:
+        """ Write all added records and close the store. """
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._connection.close()
+
+    def best_times(self, width: int, height: int, bombs: int, limit: int = 10) -> List[Tuple[int, int, int]]:
+        """
+        Method for getting best times of won games with given size and number of bombs.
+
+        :param width: Width of minefield.
+        :param height: Height of minefield.
+        :param bombs: Number of bombs.
+        :param limit: Max number of results.
+        :return: List of (time, three_bv, seed) tuples from the fastest game.
+        """
+        return self._connection.execute(
+            "SELECT time, three_bv, seed FROM games "
+            "WHERE width = ? AND height = ? AND bombs = ? AND is_win = 1 "
+            "ORDER BY time LIMIT ?", (width, height, bombs, limit)).fetchall()
+
+    def win_rate(self, width: int, height: int, bombs: int, last: int = 100) -> Optional[float]:
+        """
+        Method for getting win rate of last games with given size and number of bombs.
+
+        :param width: Width of minefield.
+        :param height: Height of minefield.
+        :param bombs: Number of bombs.
+        :param last: Number of last games to count.
+        :return: Part of won games between 0 and 1, or None if there is no games.
+        """
+        return self._connection.execute(
+            "SELECT AVG(is_win) FROM (SELECT is_win FROM games "
+            "WHERE width = ? AND height = ? AND bombs = ? "
+            "ORDER BY id DESC LIMIT ?)", (width, height, bombs, last)).fetchone()[0]